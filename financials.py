@@ -1,6 +1,11 @@
+import os
+import pathlib
+import re
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 
 # =============================
 # Intelligent, cheeky intro banner
@@ -30,6 +35,12 @@ league_files = {
     "Ekstraklasa (Poland)": "poland_ekstraklasa-2023-2024_financial_returns.csv"
 }
 
+# (file path, season) per league, with the season parsed once from the filename
+LEAGUE_META = {
+    league: (path, "-".join(re.search(r'(\d{4})-(\d{4})_financial_returns\.csv$', path).groups()))
+    for league, path in league_files.items()
+}
+
 # =============================
 # Color + Description Maps
 # =============================
@@ -64,6 +75,78 @@ column_name_map = {
     'random_choice_1_total': "£10 random pick simulation"
 }
 
+# Running-total <-> summary-total column names, and summary-total colors
+RUNNING_TO_TOTAL = {
+    col: col.replace('_running_total', '_total').replace('_running_balance', '_total')
+    for col in strategy_colors
+}
+TOTAL_TO_RUNNING = {total: running for running, total in RUNNING_TO_TOTAL.items()}
+TOTAL_TO_COLOR = {total: strategy_colors[running] for total, running in TOTAL_TO_RUNNING.items()}
+# Summary-total names in strategy order, indexable by argmax/argmin results
+TOTAL_COLS = np.array([RUNNING_TO_TOTAL[col] for col in strategy_colors])
+
+# Only the running-total columns are used downstream
+REQUIRED_COLS = list(strategy_colors.keys())
+
+# =============================
+# Cached CSV loading
+# =============================
+# Parquet copies of the league CSVs. The source CSV's mtime (ns) and size are
+# part of the filename, so a copy is only reused for exactly that CSV version
+PARQUET_CACHE_DIR = pathlib.Path(".parquet_cache")
+
+@st.cache_data(show_spinner=False)
+def load_league_df(path, mtime):
+    # mtime is part of the cache key, so an edited CSV is re-read
+    stem = pathlib.Path(path).stem
+    source = os.stat(path)
+    parquet_path = PARQUET_CACHE_DIR / f"{stem}.{source.st_mtime_ns}.{source.st_size}.parquet"
+    if parquet_path.exists():
+        return pd.read_parquet(parquet_path, columns=REQUIRED_COLS)
+
+    df = pd.read_csv(path, engine="pyarrow", usecols=REQUIRED_COLS, dtype_backend="pyarrow")
+    # float32 is plenty for £0.01 returns and halves what plotting/reductions stream
+    df[REQUIRED_COLS] = df[REQUIRED_COLS].astype("float32")
+
+    # Best effort: an unwritable app directory just means no Parquet cache.
+    # Write then rename so a concurrent reader never sees a partial file.
+    try:
+        PARQUET_CACHE_DIR.mkdir(exist_ok=True)
+        tmp_path = parquet_path.with_suffix(f".{os.getpid()}.tmp")
+        df.to_parquet(tmp_path, compression="snappy")
+        os.replace(tmp_path, parquet_path)
+        # Drop copies made from older versions of this CSV
+        for old_path in PARQUET_CACHE_DIR.glob(f"{stem}.*.parquet"):
+            if old_path != parquet_path:
+                old_path.unlink(missing_ok=True)
+    except OSError:
+        pass
+    return df
+
+@st.cache_data(show_spinner=False)
+def league_final_values(league, loaded_mtime, _df):
+    # End-of-season value of each strategy in the frame that was loaded; keyed by
+    # league + load-time mtime (the leading underscore keeps _df out of the key)
+    return _df[list(strategy_colors.keys())].iloc[-1].to_numpy(dtype=np.float32)
+
+# =============================
+# Strategy key (legend) HTML
+# =============================
+def build_legend_html(colmap):
+    # One string for the whole key, so it renders with a single st.markdown call
+    return "".join(
+        f"<div style='display: flex; align-items: center; margin-bottom: 8px;'>"
+        f"<div style='width: 20px; height: 20px; background-color: {color}; "
+        f"margin-right: 10px; border: 1px solid #000;'></div>"
+        f"<span style='font-size:16px;'>{description}</span>"
+        f"</div>"
+        for color, description in colmap
+    )
+
+# The keys depend only on the static maps above, so build them once at import
+LEGEND_HTML_RUNNING = build_legend_html((strategy_colors[col], label_dict[col]) for col in strategy_colors)
+LEGEND_HTML_TOTAL = build_legend_html((TOTAL_TO_COLOR[col], desc) for col, desc in column_name_map.items())
+
 # =============================
 # League selection and loading
 # =============================
@@ -74,15 +157,17 @@ if st.button("Load Data"):
         st.warning("Please select at least one league.")
     else:
         st.info("✅ Scraped with imagination.")
-        for league in selected_leagues:
-            file_path = league_files[league]
-            df = pd.read_csv(file_path)
+        # Leagues are independent files, so read them concurrently
+        file_paths = [league_files[league] for league in selected_leagues]
+        mtimes = [os.path.getmtime(file_path) for file_path in file_paths]
+        with ThreadPoolExecutor(max_workers=min(8, len(selected_leagues))) as executor:
+            dfs = dict(zip(selected_leagues, executor.map(load_league_df, file_paths, mtimes)))
 
-            season = file_path.split('-')[-2] + '-' + file_path.split('-')[-1].replace('_financial_returns.csv', '')
-            df.insert(0, "league_name", league)
-            df.insert(1, "season", season)
-
-            st.session_state[f"{league}_df"] = df
+        # One mapping of league -> (DataFrame, CSV mtime at load) for everything
+        # loaded this session; the views work from these frames, not the files
+        st.session_state.setdefault("league_dfs", {}).update(
+            (league, (df, mtime)) for (league, df), mtime in zip(dfs.items(), mtimes)
+        )
 
         st.success("✅ Data loaded! Now choose what you’d like to view.")
 
@@ -90,133 +175,130 @@ if st.button("Load Data"):
 # Fixture-by-fixture plots
 # =============================
 if st.button("View Financial Return Columns Plots"):
-    st.caption("✅ Visual test: Watching strategies rise, sink, or wobble around.")
-    for league in selected_leagues:
-        key_name = f"{league}_df"
-        if key_name in st.session_state:
-            df = st.session_state[key_name]
-            cols_to_plot = list(strategy_colors.keys())
+    league_dfs = st.session_state.get("league_dfs", {})
+    loaded = [league for league in selected_leagues if league in league_dfs]
+    if not loaded:
+        st.warning("Please load at least one of the selected leagues first.")
+    else:
+        # Imported here so reruns that don't plot skip the matplotlib import
+        import matplotlib.pyplot as plt
+        from matplotlib.collections import LineCollection
+
+        st.caption("✅ Visual test: Watching strategies rise, sink, or wobble around.")
+        # Build the figure and its static artists once; per league only the
+        # spans, line data, limits and title change
+        cols_to_plot = list(strategy_colors.keys())
+        fig, ax = plt.subplots(figsize=(14, 6))
+        # Rasterized so vector exports embed one image rather than every fixture vertex
+        lc = LineCollection([], colors=[strategy_colors[col] for col in cols_to_plot], linewidths=2, rasterized=True)
+        ax.add_collection(lc)
+        ax.axhline(0, color='black', linestyle='--', linewidth=2)
+        ax.set_xlabel('Fixture Number', fontsize=13)
+        ax.set_ylabel('Running Returns (£)', fontsize=13)
+        ax.grid(True)
+        spans = []
 
-            st.write(f"## {league} ({df.iloc[0]['season']}) — Fixture-by-Fixture Returns")
-            fig, ax = plt.subplots(figsize=(14, 6))
+        for league in loaded:
+            df, _ = league_dfs[league]
 
-            ymax = df[cols_to_plot].max().max()
-            ymin = df[cols_to_plot].min().min()
-            ax.axhspan(0, ymax, facecolor='lightgreen', alpha=0.3)
-            ax.axhspan(ymin, 0, facecolor='mistyrose', alpha=0.4)
+            season = LEAGUE_META[league][1]
+            st.write(f"## {league} ({season}) — Fixture-by-Fixture Returns")
 
-            for col in cols_to_plot:
-                ax.plot(df.index, df[col], label=col, color=strategy_colors[col], linewidth=2)
+            # Materialise the strategy block once; reused for limits and line segments
+            arr = df[cols_to_plot].to_numpy(copy=False)
+            ymax = arr.max()
+            ymin = arr.min()
+            for span in spans:
+                span.remove()
+            spans = [
+                ax.axhspan(0, ymax, facecolor='lightgreen', alpha=0.3),
+                ax.axhspan(ymin, 0, facecolor='mistyrose', alpha=0.4)
+            ]
 
-            ax.axhline(0, color='black', linestyle='--', linewidth=2)
+            # One collection for all strategies instead of a Line2D per column
+            x = df.index.to_numpy()
+            lc.set_segments(np.stack([np.column_stack([x, arr[:, i]]) for i in range(len(cols_to_plot))]))
+
+            # Same limits autoscale gave over the spans + lines (0 always in range, 5% margin)
+            lo, hi = min(ymin, 0), max(ymax, 0)
+            pad = (hi - lo) * 0.05
+            ax.set_ylim(lo - pad, hi + pad)
             ax.set_xlim(0, len(df) - 1)
-            ax.set_xlabel('Fixture Number', fontsize=13)
-            ax.set_ylabel('Running Returns (£)', fontsize=13)
-            ax.set_title(f"{league} — {df.iloc[0]['season']}", fontsize=16)
-            ax.grid(True)
-            st.pyplot(fig)
+            ax.set_title(f"{league} — {season}", fontsize=16)
+            st.pyplot(fig, clear_figure=False)
 
             st.markdown("---")
             st.write("### Strategy Key:")
-            for col in cols_to_plot:
-                color = strategy_colors[col]
-                description = label_dict[col]
-                st.markdown(
-                    f"<div style='display: flex; align-items: center; margin-bottom: 8px;'>"
-                    f"<div style='width: 20px; height: 20px; background-color: {color}; "
-                    f"margin-right: 10px; border: 1px solid #000;'></div>"
-                    f"<span style='font-size:16px;'>{description}</span>"
-                    f"</div>",
-                    unsafe_allow_html=True
-                )
+            st.markdown(LEGEND_HTML_RUNNING, unsafe_allow_html=True)
             st.markdown("---")
 
 # =============================
 # Best & worst return analysis
 # =============================
 if st.button("View Combined Best & Worst Returns"):
-    st.caption("✅ Crunch test: Let’s see who strutted and who stumbled, league by league.")
-    best_worst_records = []
-
-    for league in selected_leagues:
-        key_name = f"{league}_df"
-        if key_name in st.session_state:
-            df = st.session_state[key_name]
-            final_values = {col.replace('_running_total', '_total').replace('_running_balance', '_total'): df[col].iloc[-1] for col in strategy_colors.keys()}
-            best_col = max(final_values, key=final_values.get)
-            worst_col = min(final_values, key=final_values.get)
-
-            best_worst_records.append({
-                'league_name': league,
-                'best_return': final_values[best_col],
-                'best_return_column': best_col,
-                'worst_return': final_values[worst_col],
-                'worst_return_column': worst_col
-            })
-
-    summary_df = pd.DataFrame(best_worst_records)
-
-    # Add descriptive names
-    summary_df['best_return_column_desc'] = summary_df['best_return_column'].map(column_name_map)
-    summary_df['worst_return_column_desc'] = summary_df['worst_return_column'].map(column_name_map)
-
-    # Reorder columns for clean display
-    summary_df_display = summary_df[['league_name', 'best_return', 'best_return_column_desc', 'worst_return', 'worst_return_column_desc']]
-    summary_df_display['best_return'] = summary_df_display['best_return'].apply(lambda x: f"£{x:,.2f}")
-    summary_df_display['worst_return'] = summary_df_display['worst_return'].apply(lambda x: f"£{x:,.2f}")
-
-    st.write("### Best & Worst Returns (From Current Loaded Leagues)")
-    st.dataframe(summary_df_display)
-
-    # Plot best returns
-    st.write("### ✅ Best Return Per League")
-    best_colors = summary_df['best_return_column'].map(lambda x: strategy_colors.get(x.replace('_total', '_running_total'), 'grey'))
-    fig_best, ax_best = plt.subplots(figsize=(12, 6))
-    ax_best.bar(summary_df['league_name'], summary_df['best_return'], color=best_colors)
-    ax_best.set_ylabel("Best Return (£)", fontsize=12)
-    ax_best.set_xticklabels(summary_df['league_name'], rotation=45, ha='right')
-    ax_best.set_title("Best Strategy Return Per League (Selected Leagues)", fontsize=14)
-    ax_best.axhline(0, color='black', linestyle='--')
-    st.pyplot(fig_best)
-
-    st.write("### Strategy Key:")
-    for col, desc in column_name_map.items():
-        color = strategy_colors.get(col.replace('_total', '_running_total'), 'grey')
-        st.markdown(
-            f"<div style='display: flex; align-items: center; margin-bottom: 8px;'>"
-            f"<div style='width: 20px; height: 20px; background-color: {color}; "
-            f"margin-right: 10px; border: 1px solid #000;'></div>"
-            f"<span style='font-size:16px;'>{desc}</span>"
-            f"</div>",
-            unsafe_allow_html=True
-        )
+    league_dfs = st.session_state.get("league_dfs", {})
+    loaded = [league for league in selected_leagues if league in league_dfs]
+    if not loaded:
+        st.warning("Please load at least one of the selected leagues first.")
+    else:
+        import matplotlib.pyplot as plt
 
-    st.markdown("---")
-
-    # Plot worst returns
-    st.write("### ❌ Worst Return Per League")
-    worst_colors = summary_df['worst_return_column'].map(lambda x: strategy_colors.get(x.replace('_total', '_running_total'), 'grey'))
-    fig_worst, ax_worst = plt.subplots(figsize=(12, 6))
-    ax_worst.bar(summary_df['league_name'], summary_df['worst_return'], color=worst_colors)
-    ax_worst.set_ylabel("Worst Return (£)", fontsize=12)
-    ax_worst.set_xticklabels(summary_df['league_name'], rotation=45, ha='right')
-    ax_worst.set_title("Worst Strategy Return Per League (Selected Leagues)", fontsize=14)
-    ax_worst.axhline(0, color='black', linestyle='--')
-    st.pyplot(fig_worst)
-
-    st.write("### Strategy Key:")
-    for col, desc in column_name_map.items():
-        color = strategy_colors.get(col.replace('_total', '_running_total'), 'grey')
-        st.markdown(
-            f"<div style='display: flex; align-items: center; margin-bottom: 8px;'>"
-            f"<div style='width: 20px; height: 20px; background-color: {color}; "
-            f"margin-right: 10px; border: 1px solid #000;'></div>"
-            f"<span style='font-size:16px;'>{desc}</span>"
-            f"</div>",
-            unsafe_allow_html=True
-        )
+        st.caption("✅ Crunch test: Let’s see who strutted and who stumbled, league by league.")
+        # Final values of every strategy for every league as one (n_leagues, 7) block,
+        # so best/worst come from a single argmax/argmin pass over all leagues
+        final_values = np.stack([
+            league_final_values(league, league_dfs[league][1], league_dfs[league][0])
+            for league in loaded
+        ])
+        best_idx = final_values.argmax(axis=1)
+        worst_idx = final_values.argmin(axis=1)
+        rows = np.arange(len(loaded))
+
+        summary_df = pd.DataFrame({
+            'league_name': loaded,
+            'best_return': final_values[rows, best_idx],
+            'best_return_column': TOTAL_COLS[best_idx],
+            'worst_return': final_values[rows, worst_idx],
+            'worst_return_column': TOTAL_COLS[worst_idx]
+        })
+
+        # Add descriptive names
+        summary_df['best_return_column_desc'] = summary_df['best_return_column'].map(column_name_map)
+        summary_df['worst_return_column_desc'] = summary_df['worst_return_column'].map(column_name_map)
+
+        # Reorder columns for clean display
+        summary_df_display = summary_df[['league_name', 'best_return', 'best_return_column_desc', 'worst_return', 'worst_return_column_desc']]
+
+        st.write("### Best & Worst Returns (From Current Loaded Leagues)")
+        # Format at render time; the underlying returns stay numeric
+        st.dataframe(summary_df_display.style.format({'best_return': '£{:,.2f}', 'worst_return': '£{:,.2f}'}))
+
+        # Plot best and worst returns side by side on one figure
+        st.write("### ✅ Best & ❌ Worst Return Per League")
+        fig, (ax_best, ax_worst) = plt.subplots(1, 2, figsize=(20, 6))
+
+        best_colors = summary_df['best_return_column'].map(TOTAL_TO_COLOR)
+        # bar() already labels the categorical ticks; just rotate the existing labels
+        ax_best.bar(summary_df['league_name'], summary_df['best_return'], color=best_colors, rasterized=True)
+        ax_best.set_ylabel("Best Return (£)", fontsize=12)
+        ax_best.tick_params(axis='x', labelrotation=45)
+        plt.setp(ax_best.get_xticklabels(), ha='right')
+        ax_best.set_title("Best Strategy Return Per League (Selected Leagues)", fontsize=14)
+        ax_best.axhline(0, color='black', linestyle='--')
+
+        worst_colors = summary_df['worst_return_column'].map(TOTAL_TO_COLOR)
+        ax_worst.bar(summary_df['league_name'], summary_df['worst_return'], color=worst_colors, rasterized=True)
+        ax_worst.set_ylabel("Worst Return (£)", fontsize=12)
+        ax_worst.tick_params(axis='x', labelrotation=45)
+        plt.setp(ax_worst.get_xticklabels(), ha='right')
+        ax_worst.set_title("Worst Strategy Return Per League (Selected Leagues)", fontsize=14)
+        ax_worst.axhline(0, color='black', linestyle='--')
+        st.pyplot(fig)
+
+        st.write("### Strategy Key:")
+        st.markdown(LEGEND_HTML_TOTAL, unsafe_allow_html=True)
 
-    st.markdown("---")
+        st.markdown("---")
 
 # ✅ Closing line
 st.markdown("**Play with it, spot the patterns — and see who really comes out on top. Definitely food for thought.**")